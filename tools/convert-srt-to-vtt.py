@@ -11,8 +11,21 @@ This script converts SRT files to VTT while preserving all subtitle content.
 import os
 import sys
 import argparse
-import re
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import media_walk
+
+_SRT_EXTS = {'.srt'}
+
+# Serializes console output from worker threads
+print_lock = threading.Lock()
+
+def log(message):
+    """Print a message without interleaving output from other workers"""
+    with print_lock:
+        print(message, flush=True)
 
 def convert_srt_timestamp(srt_timestamp):
     """
@@ -21,88 +34,80 @@ def convert_srt_timestamp(srt_timestamp):
     """
     return srt_timestamp.replace(',', '.')
 
-def convert_srt_to_vtt(srt_path):
-    """Convert a single SRT file to VTT format"""
-    vtt_path = srt_path.parent / f"{srt_path.stem}.vtt"
-
-    # Skip if VTT already exists
-    if vtt_path.exists():
-        print(f"   ⏭️  VTT already exists: {vtt_path.name}")
-        return vtt_path
-
-    print(f"\n📄 Converting: {srt_path.name}")
-
-    try:
-        with open(srt_path, 'r', encoding='utf-8') as srt_file:
-            srt_content = srt_file.read()
-
-        # Start VTT with header
-        vtt_content = "WEBVTT\n\n"
-
-        # Split into subtitle blocks (separated by blank lines)
-        blocks = re.split(r'\n\s*\n', srt_content.strip())
-
-        for block in blocks:
-            if not block.strip():
-                continue
+def write_vtt_cues(srt_file, vtt_file):
+    """
+    Stream SRT lines into VTT cues one line at a time
 
-            lines = block.strip().split('\n')
+    SRT format:
+    1
+    00:00:01,000 --> 00:00:03,000
+    Subtitle text
+    """
+    vtt_file.write("WEBVTT\n\n")
 
-            # Skip empty blocks
-            if len(lines) < 2:
-                continue
+    in_text = False
 
-            # SRT format:
-            # 1
-            # 00:00:01,000 --> 00:00:03,000
-            # Subtitle text
+    for line in srt_file:
+        line = line.rstrip()
 
-            # Find the timestamp line (contains -->)
-            timestamp_line = None
-            text_start_idx = 0
+        # Blank (or whitespace-only) lines end the current block
+        if not line:
+            if in_text:
+                vtt_file.write('\n')
+                in_text = False
+            continue
 
-            for i, line in enumerate(lines):
-                if '-->' in line:
-                    timestamp_line = line
-                    text_start_idx = i + 1
-                    break
+        if in_text:
+            vtt_file.write(line)
+            vtt_file.write('\n')
+        elif '-->' in line:
+            vtt_file.write(convert_srt_timestamp(line.strip()))
+            vtt_file.write('\n')
+            in_text = True
+        # Anything else before the timestamp is the cue number, which VTT drops
 
-            if not timestamp_line:
-                continue
+    if in_text:
+        vtt_file.write('\n')
 
-            # Convert timestamps
-            vtt_timestamp = convert_srt_timestamp(timestamp_line)
+def convert_srt_to_vtt(srt_path):
+    """Convert a single SRT file to VTT format"""
+    vtt_path = srt_path.parent / f"{srt_path.stem}.vtt"
 
-            # Get subtitle text (everything after timestamp line)
-            subtitle_text = '\n'.join(lines[text_start_idx:])
+    # Create the VTT exclusively so the kernel refuses to overwrite one that
+    # already exists (or that another worker just started writing)
+    try:
+        vtt_fd = os.open(vtt_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        log(f"   ⏭️  VTT already exists: {vtt_path.name}")
+        return vtt_path
 
-            # Write to VTT
-            vtt_content += f"{vtt_timestamp}\n"
-            vtt_content += f"{subtitle_text}\n\n"
+    log(f"\n📄 Converting: {srt_path.name}")
 
-        # Write VTT file
-        with open(vtt_path, 'w', encoding='utf-8') as vtt_file:
-            vtt_file.write(vtt_content)
+    try:
+        with os.fdopen(vtt_fd, 'w', encoding='utf-8') as vtt_file, \
+                open(srt_path, 'r', encoding='utf-8') as srt_file:
+            write_vtt_cues(srt_file, vtt_file)
 
-        print(f"   ✅ Saved: {vtt_path.name}")
+        log(f"   ✅ Saved: {vtt_path.name}")
         return vtt_path
 
     except Exception as e:
-        print(f"   ❌ Error converting {srt_path.name}: {e}")
+        # Don't leave a partial VTT behind, it would be skipped next run
+        vtt_path.unlink(missing_ok=True)
+        log(f"   ❌ Error converting {srt_path.name}: {e}")
         return None
 
 def find_srt_files(media_dir="media"):
     """Find all SRT files that don't have corresponding VTT files"""
     srt_files_without_vtt = []
 
-    for root, dirs, files in os.walk(media_dir):
-        for file in files:
-            if file.lower().endswith('.srt'):
-                srt_path = Path(root) / file
-                vtt_path = srt_path.parent / f"{srt_path.stem}.vtt"
-
-                if not vtt_path.exists():
-                    srt_files_without_vtt.append(srt_path)
+    for root, entries in media_walk.walk(media_dir):
+        names = {entry.name for entry in entries}
+        for entry in entries:
+            srt_stem, ext = os.path.splitext(entry.name)
+            if ext.lower() in _SRT_EXTS and entry.is_file():
+                if f"{srt_stem}.vtt" not in names:
+                    srt_files_without_vtt.append(Path(entry.path))
 
     return srt_files_without_vtt
 
@@ -168,13 +173,19 @@ def main():
     successful = 0
     failed = 0
 
-    for i, srt_file in enumerate(srt_files, 1):
-        print(f"\n[{i}/{len(srt_files)}]")
-        result = convert_srt_to_vtt(srt_file)
-        if result:
-            successful += 1
-        else:
-            failed += 1
+    # Each conversion is independent file I/O, so run them concurrently
+    with ThreadPoolExecutor(max_workers=min(32, len(srt_files))) as executor:
+        futures = {
+            executor.submit(convert_srt_to_vtt, srt_file): srt_file
+            for srt_file in srt_files
+        }
+
+        for i, future in enumerate(as_completed(futures), 1):
+            if future.result():
+                successful += 1
+            else:
+                failed += 1
+            log(f"[{i}/{len(srt_files)}] {futures[future].name}")
 
     print(f"\n{'='*60}")
     print(f"✅ Conversion complete!")
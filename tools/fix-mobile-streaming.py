@@ -11,17 +11,24 @@ relocate the moov atom without re-encoding.
 
 import os
 import sys
+import json
 import subprocess
 import tempfile
-import shutil
+import functools
+import struct
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import media_walk
+
+_MP4_EXTS = {'.mp4'}
 
 
 def check_dependencies():
     """Check if ffmpeg and ffprobe are installed"""
     try:
-        subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
-        subprocess.run(['ffprobe', '-version'], capture_output=True, check=True)
+        subprocess.run(['ffmpeg', '-version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        subprocess.run(['ffprobe', '-version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
         return True
     except (subprocess.CalledProcessError, FileNotFoundError):
         print("\n❌ Error: ffmpeg/ffprobe is not installed")
@@ -32,50 +39,103 @@ def check_dependencies():
         return False
 
 
+@functools.lru_cache(maxsize=None)
+def _cached_stat(path_str):
+    """Stat a path once per run so the scan, listing and fix steps share it"""
+    return os.stat(path_str)
+
+
+def _scan_mp4_atoms(video_path):
+    """
+    Walk the top-level MP4 atoms, reading only their 8-byte headers.
+    Returns: 'start', 'end', or None if the atoms cannot be found
+    """
+    seen_mdat = False
+
+    with open(video_path, 'rb') as f:
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return None
+
+            size, atom_type = struct.unpack('>I4s', header)
+            header_len = 8
+
+            if size == 1:
+                # 64-bit size follows the type
+                extended = f.read(8)
+                if len(extended) < 8:
+                    return None
+                size = struct.unpack('>Q', extended)[0]
+                header_len = 16
+            elif size == 0:
+                # Atom extends to end of file, nothing can follow it
+                if atom_type == b'moov':
+                    return 'end' if seen_mdat else 'start'
+                return None
+
+            if atom_type == b'moov':
+                return 'end' if seen_mdat else 'start'
+            if atom_type == b'mdat':
+                seen_mdat = True
+
+            if size < header_len:
+                return None  # Corrupt atom header
+
+            f.seek(size - header_len, os.SEEK_CUR)
+
+
+# If the first media packet starts this close to the beginning of the file,
+# only ftyp and the mdat header precede it, so moov must be at the end
+MOOV_FALLBACK_THRESHOLD = 1024
+
+
+def _probe_moov_position(video_path):
+    """
+    Fallback for files the atom walker can't parse: ask ffprobe for the byte
+    offset of the first packet and infer where the moov atom sits.
+    Only trusted when ffprobe reads the file as MP4/MOV, since other formats
+    (e.g. MPEG-TS named .mp4) also start their packets near the beginning.
+    Returns: 'start', 'end', or None if this can't be determined
+    """
+    cmd = [
+        'ffprobe',
+        '-v', 'error',
+        '-print_format', 'json',
+        '-show_entries', 'packet=pos,flags:stream=index:format=format_name',
+        '-read_intervals', '%+#1',
+        str(video_path)
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+    except subprocess.TimeoutExpired:
+        return None
+    if result.returncode != 0:
+        return None
+
+    probe = json.loads(result.stdout)
+    format_name = probe.get('format', {}).get('format_name', '')
+    if 'mov' not in format_name and 'mp4' not in format_name:
+        return None
+
+    packets = probe.get('packets', [])
+    positions = [int(p['pos']) for p in packets if p.get('pos', 'N/A') != 'N/A']
+    if not positions:
+        return None
+
+    return 'start' if min(positions) > MOOV_FALLBACK_THRESHOLD else 'end'
+
+
 def check_moov_position(video_path):
     """
     Check if moov atom is at the beginning or end of the file.
     Returns: 'start', 'end', or None if cannot determine
     """
     try:
-        cmd = [
-            'ffprobe',
-            '-v', 'trace',
-            str(video_path)
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        output = result.stderr  # ffprobe outputs trace to stderr
-
-        moov_pos = None
-        mdat_pos = None
-
-        for line in output.split('\n'):
-            if "type:'moov'" in line and "parent:'root'" in line:
-                # Extract position from line like: type:'moov' parent:'root' sz: 1057508 264137053 265194553
-                parts = line.split()
-                for i, part in enumerate(parts):
-                    if part.startswith('sz:'):
-                        # Position is 2 numbers after sz:
-                        if i + 2 < len(parts):
-                            try:
-                                moov_pos = int(parts[i + 2])
-                            except ValueError:
-                                pass
-                        break
-            elif "type:'mdat'" in line and "parent:'root'" in line:
-                parts = line.split()
-                for i, part in enumerate(parts):
-                    if part.startswith('sz:'):
-                        if i + 2 < len(parts):
-                            try:
-                                mdat_pos = int(parts[i + 2])
-                            except ValueError:
-                                pass
-                        break
-
-        if moov_pos is not None and mdat_pos is not None:
-            return 'start' if moov_pos < mdat_pos else 'end'
-        return None
+        position = _scan_mp4_atoms(video_path)
+        if position is None:
+            position = _probe_moov_position(video_path)
+        return position
     except Exception as e:
         print(f"   ⚠️  Could not check moov position: {e}")
         return None
@@ -106,11 +166,11 @@ def fix_moov_position(video_path):
             return False
 
         # Get file sizes for comparison
-        original_size = video_path.stat().st_size
+        original_size = _cached_stat(str(video_path)).st_size
         new_size = temp_path.stat().st_size
 
         # Replace original with fixed version
-        shutil.move(str(temp_path), str(video_path))
+        os.replace(temp_path, video_path)
 
         print(f"   ✅ Fixed! Size: {original_size / 1024 / 1024:.1f}MB → {new_size / 1024 / 1024:.1f}MB")
         return True
@@ -129,22 +189,28 @@ def find_videos_needing_fix(media_dir="media"):
 
     print(f"\n🔍 Scanning for MP4 files...")
 
-    for root, dirs, files in os.walk(media_dir):
-        for file in files:
-            if file.lower().endswith('.mp4'):
-                video_path = Path(root) / file
-                print(f"   Checking: {video_path.name}...", end=" ", flush=True)
+    video_paths = [
+        Path(entry.path)
+        for root, entries in media_walk.walk(media_dir)
+        for entry in entries
+        if os.path.splitext(entry.name)[1].lower() in _MP4_EXTS and entry.is_file()
+    ]
+
+    # Checks are independent file reads, so run them concurrently
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        moov_positions = list(executor.map(check_moov_position, video_paths))
 
-                moov_pos = check_moov_position(video_path)
+    for video_path, moov_pos in zip(video_paths, moov_positions):
+        print(f"   Checking: {video_path.name}...", end=" ")
 
-                if moov_pos == 'end':
-                    print("needs fix")
-                    videos_to_fix.append(video_path)
-                elif moov_pos == 'start':
-                    print("OK")
-                    videos_ok.append(video_path)
-                else:
-                    print("unknown format, skipping")
+        if moov_pos == 'end':
+            print("needs fix")
+            videos_to_fix.append(video_path)
+        elif moov_pos == 'start':
+            print("OK")
+            videos_ok.append(video_path)
+        else:
+            print("unknown format, skipping")
 
     return videos_to_fix, videos_ok
 
@@ -175,7 +241,7 @@ def main():
 
     print(f"\nFiles that need fixing:")
     for video in videos_to_fix:
-        size_mb = video.stat().st_size / 1024 / 1024
+        size_mb = _cached_stat(str(video)).st_size / 1024 / 1024
         print(f"  - {video} ({size_mb:.1f}MB)")
 
     # Confirm
@@ -19,64 +19,280 @@ Examples:
     python generate-hls.py --stall-timeout 60 # Kill if no progress for 60 seconds
     python generate-hls.py --skip "Extras"    # Skip files containing "Extras" in path
     python generate-hls.py -s "Extras" -s "Animatics" -t 30  # Multiple skips + timeout
+    python generate-hls.py -p 4 --threads-per-encode 2   # Parallel, at least 2 cores each
+    python generate-hls.py --hwaccel none     # Always transcode with libx264 on the CPU
 """
 
 import os
 import sys
 import subprocess
 import argparse
+import functools
+import queue
+import shutil
+import tempfile
 from pathlib import Path
+from typing import Iterator
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import json
 
+import probe_cache
+
+# Video codecs browsers can't play natively, re-encoded to H.264
+TRANSCODE_CODECS = ('hevc', 'h265', 'vp9', 'av1')
+
+VAAPI_DEVICE = '/dev/dri/renderD128'
+
+# Hashing a source reads every packet of it (at demux speed, no decode), so
+# allow for large files on slow disks, and only a few at once
+SOURCE_HASH_TIMEOUT = 30 * 60
+SOURCE_HASH_WORKERS = 4
+
+# Hardware H.264 encoders, in the order --hwaccel auto tries them.
+# input_args go before -i, output_args replace the libx264 settings.
+HW_ENCODERS = {
+    'nvenc': {
+        'encoder': 'h264_nvenc',
+        'input_args': [],
+        'output_args': [
+            '-c:v', 'h264_nvenc',
+            '-preset', 'p5',
+            '-tune', 'hq',
+            '-rc', 'vbr',
+            '-cq', '23',
+            '-b:v', '0',
+            '-profile:v', 'high',
+            '-pix_fmt', 'yuv420p',
+        ],
+    },
+    'qsv': {
+        'encoder': 'h264_qsv',
+        'input_args': [],
+        'output_args': [
+            '-c:v', 'h264_qsv',
+            '-preset', 'veryfast',
+            '-global_quality', '23',
+            '-look_ahead', '1',
+            '-profile:v', 'high',
+        ],
+    },
+    'vaapi': {
+        'encoder': 'h264_vaapi',
+        'input_args': [
+            '-hwaccel', 'vaapi',
+            '-hwaccel_output_format', 'vaapi',
+            '-vaapi_device', VAAPI_DEVICE,
+        ],
+        'output_args': [
+            # Frames stay on the GPU when it can decode the source; when it
+            # can't, ffmpeg decodes in software and hwupload moves them over.
+            # scale_vaapi converts 10-bit sources to 8-bit for H.264.
+            '-vf', 'format=nv12|vaapi,hwupload,scale_vaapi=format=nv12',
+            '-c:v', 'h264_vaapi',
+            '-qp', '23',
+            '-profile:v', 'high',
+        ],
+    },
+    'vt': {
+        'encoder': 'h264_videotoolbox',
+        'input_args': [],
+        'output_args': [
+            '-c:v', 'h264_videotoolbox',
+            '-q:v', '65',
+            '-profile:v', 'high',
+            '-pix_fmt', 'yuv420p',
+        ],
+    },
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_video_info(file_path: str, write_cache: bool = True) -> dict:
+    """
+    Get the video codec, duration (seconds) and first audio stream details of
+    a file with one ffprobe call.
 
-def get_video_codec(file_path: str) -> str:
-    """Get the video codec of a file using ffprobe."""
+    Results are cached in a sidecar file across runs (see probe_cache.py;
+    write_cache=False skips saving it) and in memory per path, so the status
+    scan in main() and generate_hls() share a single probe.
+    """
     try:
-        result = subprocess.run(
-            [
-                'ffprobe',
-                '-v', 'error',
-                '-select_streams', 'v:0',
-                '-show_entries', 'stream=codec_name',
-                '-of', 'default=noprint_wrappers=1:nokey=1',
-                file_path
-            ],
+        data = probe_cache.probe(file_path, write=write_cache)
+    except Exception as e:
+        print(f"  Warning: Could not probe {file_path}: {e}")
+        return {'codec': 'unknown', 'duration': 0.0, 'audio_codec': 'unknown',
+                'channels': 0, 'sample_rate': 0, 'audio_bit_rate': 0}
+
+    streams = data.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'), {})
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), {})
+
+    def as_number(value, convert=int):
+        try:
+            return convert(value)
+        except (TypeError, ValueError):
+            return convert(0)
+
+    return {
+        'codec': video.get('codec_name', 'unknown').strip().lower(),
+        'duration': as_number(data.get('format', {}).get('duration'), float),
+        'audio_codec': audio.get('codec_name', 'unknown').strip().lower(),
+        'channels': as_number(audio.get('channels')),
+        'sample_rate': as_number(audio.get('sample_rate')),
+        'audio_bit_rate': as_number(audio.get('bit_rate')),
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def hw_encoder_works(name: str) -> bool:
+    """
+    Check that a hardware encoder is usable by encoding a few blank frames.
+
+    ffmpeg builds often list encoders (e.g. h264_nvenc) for hardware that
+    isn't present, so being compiled in is not enough. The test uses the
+    same input_args/output_args as a real transcode, so options the
+    encoder or driver rejects are caught here rather than on every file.
+    """
+    encoder = HW_ENCODERS[name]['encoder']
+    try:
+        listed = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-encoders'],
             capture_output=True,
             text=True,
             timeout=30
+        ).stdout
+        if encoder not in listed:
+            return False
+
+        hw = HW_ENCODERS[name]
+        test_args = [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error',
+            *hw['input_args'],
+            '-f', 'lavfi', '-i', 'color=black:s=256x256:d=0.1',
+            *hw['output_args'],
+            '-f', 'null', '-'
+        ]
+
+        result = subprocess.run(
+            test_args,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=30
         )
-        return result.stdout.strip().lower()
-    except Exception as e:
-        print(f"  Warning: Could not detect codec for {file_path}: {e}")
-        return 'unknown'
+        return result.returncode == 0
+    except Exception:
+        return False
+
+
+def resolve_hw_encoder(hwaccel: str) -> str | None:
+    """Map the --hwaccel option to a usable HW_ENCODERS key (None = libx264)."""
+    if hwaccel == 'none':
+        return None
+    if hwaccel == 'auto':
+        return next((name for name in HW_ENCODERS if hw_encoder_works(name)), None)
+    return hwaccel if hw_encoder_works(hwaccel) else None
+
+
+def physical_cpu_order() -> list[int]:
+    """
+    List usable CPUs with one hyperthread sibling per physical core first.
+
+    Filling slots in this order keeps concurrent encoders off each other's
+    sibling threads (which share a core's execution units) until the
+    physical cores run out. Falls back to plain numbering without sysfs.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        allowed = sorted(os.sched_getaffinity(0))
+    else:
+        allowed = list(range(os.cpu_count() or 1))
+
+    primary = []
+    secondary = []
+    seen_cores = set()
+    for cpu in allowed:
+        siblings_path = Path(f'/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list')
+        try:
+            siblings = siblings_path.read_text().strip()
+        except OSError:
+            return allowed
+
+        if siblings in seen_cores:
+            secondary.append(cpu)
+        else:
+            seen_cores.add(siblings)
+            primary.append(cpu)
+
+    return primary + secondary
+
+
+def cpu_slots(count: int, size: int) -> list[set[int]]:
+    """Split the usable CPUs into up to count disjoint sets of size CPUs."""
+    cpus = physical_cpu_order()
+    return [set(cpus[i * size:(i + 1) * size]) for i in range(min(count, len(cpus) // size))]
+
+
+def generate_hls_pinned(slots: queue.Queue, *args, **kwargs) -> tuple[bool, str]:
+    """Run generate_hls() with ffmpeg pinned to a free CPU slot from the queue."""
+    cpus = slots.get()
+    try:
+        return generate_hls(*args, cpus=cpus, **kwargs)
+    finally:
+        slots.put(cpus)
+
+
+@functools.lru_cache(maxsize=None)
+def _cached_stat(path_str: str) -> os.stat_result:
+    """Stat a path once per run so the listing and generate passes share it."""
+    return os.stat(path_str)
+
+
+def _source_hash_args(output: str) -> list[str]:
+    """ffmpeg output args that hash the mapped video+audio packets (no decode)."""
+    return [
+        '-map', '0:v:0',
+        '-map', '0:a:0',
+        '-c', 'copy',
+        '-f', 'hash',
+        '-hash', 'sha256',
+        output
+    ]
 
 
-def get_video_duration(file_path: str) -> float:
-    """Get video duration in seconds using ffprobe."""
+@functools.lru_cache(maxsize=None)
+def source_fingerprint(mkv_path: str) -> str | None:
+    """
+    Hash the packet data of the streams that go into the HLS output.
+
+    Container-level edits (tags, cover art, a touch) leave this unchanged.
+    Returns None if ffmpeg fails or takes longer than SOURCE_HASH_TIMEOUT.
+    """
     try:
         result = subprocess.run(
-            [
-                'ffprobe',
-                '-v', 'error',
-                '-show_entries', 'format=duration',
-                '-of', 'default=noprint_wrappers=1:nokey=1',
-                file_path
-            ],
-            capture_output=True,
+            ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-i', mkv_path,
+             *_source_hash_args('-')],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
             text=True,
-            timeout=30
+            timeout=SOURCE_HASH_TIMEOUT
         )
-        return float(result.stdout.strip())
-    except Exception:
-        return 0.0
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip() or None
+
 
+def is_hls_complete(hls_dir: Path, mkv_path: Path, check_source: bool = True) -> bool:
+    """
+    Check if HLS generation is complete and up-to-date.
 
-def is_hls_complete(hls_dir: Path, mkv_path: Path) -> bool:
-    """Check if HLS generation is complete and up-to-date."""
+    check_source allows hashing the MKV's packets when it is newer than the
+    playlist; without it, any newer MKV counts as out of date.
+    """
     playlist_path = hls_dir / 'playlist.m3u8'
 
-    if not playlist_path.exists():
+    try:
+        playlist_stat = _cached_stat(str(playlist_path))
+    except OSError:
         return False
 
     # Check if playlist contains ENDLIST (complete)
@@ -86,14 +302,38 @@ def is_hls_complete(hls_dir: Path, mkv_path: Path) -> bool:
             return False
 
         # Check if MKV is newer than playlist
-        if mkv_path.stat().st_mtime > playlist_path.stat().st_mtime:
+        if _cached_stat(str(mkv_path)).st_mtime <= playlist_stat.st_mtime:
+            return True
+        if not check_source:
             return False
 
-        return True
+        # The MKV changed on disk, but if its video and audio packets still
+        # match the ones the segments were made from (e.g. only tags or
+        # cover art were edited), the HLS output is still valid. Without a
+        # fingerprint from the last run, fall back to the mtime check.
+        fingerprint_path = hls_dir / 'source.sha256'
+        try:
+            stored = fingerprint_path.read_text().strip()
+        except OSError:
+            return False
+        return bool(stored) and source_fingerprint(str(mkv_path)) == stored
     except Exception:
         return False
 
 
+def touch_playlist_if_stale(hls_dir: Path, mkv_path: Path):
+    """
+    Bump the playlist mtime past the MKV's once its fingerprint has matched,
+    so the next run passes is_hls_complete on the mtime check alone.
+    """
+    playlist_path = hls_dir / 'playlist.m3u8'
+    try:
+        if _cached_stat(str(mkv_path)).st_mtime > _cached_stat(str(playlist_path)).st_mtime:
+            os.utime(playlist_path)
+    except OSError:
+        pass
+
+
 def log(message: str, flush: bool = True):
     """Print a log message with timestamp."""
     from datetime import datetime
@@ -101,48 +341,70 @@ def log(message: str, flush: bool = True):
     print(f"[{timestamp}] {message}", flush=flush)
 
 
-def generate_hls(mkv_path: Path, force: bool = False, index: int = 0, total: int = 0, timeout_minutes: int = 0, stall_timeout: int = 120) -> tuple[bool, str]:
+def generate_hls(mkv_path: Path, force: bool = False, index: int = 0, total: int = 0, timeout_minutes: int = 0, stall_timeout: int = 120, threads: int = 0, hw_encoder: str | None = None, cpus: set[int] | None = None) -> tuple[bool, str]:
     """
     Generate HLS playlist and segments for an MKV file.
 
+    threads limits the encoder threads for transcodes (0 = ffmpeg decides).
+    hw_encoder is a HW_ENCODERS key to transcode on the GPU instead of libx264.
+    cpus pins ffmpeg to a set of CPUs (Linux only, ignored elsewhere).
+
     Returns:
         tuple: (success: bool, message: str)
     """
     import time
-    import threading
+    import selectors
 
     hls_dir = Path(str(mkv_path) + '.hls')
     progress_prefix = f"[{index}/{total}]" if total > 0 else ""
 
     # Check if already done
     if not force and is_hls_complete(hls_dir, mkv_path):
+        touch_playlist_if_stale(hls_dir, mkv_path)
         log(f"{progress_prefix} Skipping (already done): {mkv_path.name}")
         return True, "Already exists (skipped)"
 
     # Create output directory
     hls_dir.mkdir(parents=True, exist_ok=True)
 
-    # Detect video codec
-    codec = get_video_codec(str(mkv_path))
-    needs_transcode = codec in ('hevc', 'h265', 'vp9', 'av1')
+    # Detect video codec and duration
+    info = get_video_info(str(mkv_path))
+    codec, duration = info['codec'], info['duration']
+    needs_transcode = codec in TRANSCODE_CODECS
+
+    # Stereo (or mono) AAC at a standard rate can go into the segments as-is
+    audio_needs_transcode = not (
+        info['audio_codec'] == 'aac'
+        and 0 < info['channels'] <= 2
+        and info['sample_rate'] in (44100, 48000)
+    )
 
-    duration = get_video_duration(str(mkv_path))
     duration_str = format_duration(duration) if duration > 0 else "??:??"
 
     log(f"{progress_prefix} Starting: {mkv_path.name}")
     log(f"  Duration: {duration_str}, Codec: {codec}, Transcode: {needs_transcode}")
+    log(f"  Audio: {info['audio_codec']}, Transcode: {audio_needs_transcode}")
 
-    # Build ffmpeg command (output progress to stderr with -stats)
+    hw = HW_ENCODERS[hw_encoder] if needs_transcode and hw_encoder else None
+
+    # Build ffmpeg command (machine-readable progress on stdout, errors only)
     ffmpeg_args = [
         'ffmpeg',
         '-hide_banner',
+        '-loglevel', 'error',
+        '-nostats',
+        '-progress', 'pipe:1',
+        '-stats_period', '2',  # Progress every 2s is plenty for logging/stall checks
         '-y',  # Overwrite output files
+        *(hw['input_args'] if hw else []),
         '-i', str(mkv_path),
         '-map', '0:v:0',
         '-map', '0:a:0',
     ]
 
-    if needs_transcode:
+    if hw:
+        ffmpeg_args.extend(hw['output_args'])
+    elif needs_transcode:
         ffmpeg_args.extend([
             '-c:v', 'libx264',
             '-preset', 'veryfast',
@@ -152,86 +414,146 @@ def generate_hls(mkv_path: Path, force: bool = False, index: int = 0, total: int
             '-level', '4.1',
             '-pix_fmt', 'yuv420p',
         ])
+        if threads > 0:
+            ffmpeg_args.extend(['-threads', str(threads)])
     else:
         ffmpeg_args.extend(['-c:v', 'copy'])
 
+    if audio_needs_transcode:
+        ffmpeg_args.extend([
+            '-c:a', 'aac',
+            '-ac', '2',
+            '-b:a', '192k',
+            '-ar', '48000',
+        ])
+    else:
+        ffmpeg_args.extend(['-c:a', 'copy'])
+
     ffmpeg_args.extend([
-        '-c:a', 'aac',
-        '-ac', '2',
-        '-b:a', '192k',
-        '-ar', '48000',
         '-f', 'hls',
         '-hls_time', '6',
         '-hls_list_size', '0',
         '-hls_segment_type', 'mpegts',
         '-hls_segment_filename', str(hls_dir / 'segment%03d.ts'),
         '-hls_flags', 'independent_segments',
-        str(hls_dir / 'playlist.m3u8')
+        str(hls_dir / 'playlist.m3u8'),
+        # Second output: fingerprint the source packets in the same pass, so
+        # a later mtime-only change to the MKV doesn't force a regenerate
+        *_source_hash_args(str(hls_dir / 'source.sha256'))
     ])
 
+    # stderr is discarded so it can never fill up and block ffmpeg; errors go
+    # to a report file instead, read back only if the run fails
+    report_fd, report_path = tempfile.mkstemp(prefix='ffmpeg-', suffix='.log')
+    os.close(report_fd)
+    ffmpeg_env = dict(os.environ, FFREPORT=f"file={report_path}:level=16")
+
     try:
         start_time = time.time()
         timeout_seconds = timeout_minutes * 60 if timeout_minutes > 0 else None
 
-        # Run ffmpeg - simple approach with threading for output
-        process = subprocess.Popen(
-            ffmpeg_args,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
+        # A child inherits the CPU affinity of the thread that forks it, so
+        # pin this worker thread around Popen and ffmpeg starts out pinned
+        pin = bool(cpus) and hasattr(os, 'sched_setaffinity')
+        if pin:
+            original_cpus = os.sched_getaffinity(0)
+            os.sched_setaffinity(0, cpus)
+
+        # Run ffmpeg and watch its -progress output on stdout
+        try:
+            process = subprocess.Popen(
+                ffmpeg_args,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                env=ffmpeg_env
+            )
+        finally:
+            if pin:
+                os.sched_setaffinity(0, original_cpus)
+
+        # Drive the timeout checks from the same loop that reads progress, so
+        # completion is noticed as soon as ffmpeg closes the pipe
+        selector = selectors.DefaultSelector()
+        selector.register(process.stdout, selectors.EVENT_READ)
+        stdout_fd = process.stdout.fileno()
+
+        pending = b''
+        out_time = 0.0
+        speed = 'N/A'
+        last_activity = time.time()
+        killed = False
+
+        while True:
+            # Sleep until output arrives or the nearest deadline passes,
+            # rather than waking on a fixed interval
+            deadlines = []
+            if timeout_seconds:
+                deadlines.append(start_time + timeout_seconds)
+            if stall_timeout > 0:
+                deadlines.append(last_activity + stall_timeout)
+            wait = max(0.0, min(deadlines) - time.time()) if deadlines else None
+
+            if selector.select(timeout=wait):
+                chunk = os.read(stdout_fd, 65536)
+                if not chunk:
+                    break  # EOF - ffmpeg has exited
+
+                last_activity = time.time()
+
+                lines = (pending + chunk).split(b'\n')
+                pending = lines.pop()
+                # Stay in bytes; only the values we keep get converted
+                for line in lines:
+                    # Only out_time_ms, speed and progress keys are used
+                    if line[:1] not in (b'o', b's', b'p'):
+                        continue
+                    key, _, value = line.partition(b'=')
+                    if key == b'out_time_ms':
+                        # Despite the name, ffmpeg reports microseconds here
+                        try:
+                            out_time = int(value) / 1_000_000
+                        except ValueError:
+                            pass
+                    elif key == b'speed':
+                        speed = value.strip().decode('ascii', errors='replace')
+                    elif key == b'progress':
+                        log(f"  time={format_duration(out_time)} speed={speed}")
 
-        # Collect stderr in a thread to prevent blocking
-        stderr_output = []
-        last_activity = [time.time()]  # Use list for mutable reference in thread
-
-        def read_stderr():
-            for line in process.stderr:
-                stderr_output.append(line)
-                last_activity[0] = time.time()
-                # Log ffmpeg progress lines (they contain "time=")
-                try:
-                    line_str = line.decode('utf-8', errors='replace').strip()
-                    if 'time=' in line_str and 'speed=' in line_str:
-                        # Extract just the relevant part
-                        log(f"  {line_str}")
-                except:
-                    pass
-
-        stderr_thread = threading.Thread(target=read_stderr, daemon=True)
-        stderr_thread.start()
-
-        # Wait for process with timeout checking
-        while process.poll() is None:
-            time.sleep(1)
             elapsed = time.time() - start_time
 
             # Check overall timeout
-            if timeout_seconds and elapsed > timeout_seconds:
+            if timeout_seconds and elapsed >= timeout_seconds:
                 log(f"  TIMEOUT after {format_duration(elapsed)} - killing process")
                 process.kill()
-                process.wait()
+                killed = True
                 break
 
             # Check stall timeout
             if stall_timeout > 0:
-                stall_time = time.time() - last_activity[0]
-                if stall_time > stall_timeout:
+                stall_time = time.time() - last_activity
+                if stall_time >= stall_timeout:
                     log(f"  STALLED for {format_duration(stall_time)} - killing process")
                     process.kill()
-                    process.wait()
+                    killed = True
                     break
 
-        stderr_thread.join(timeout=2)
+        selector.close()
+        process.wait()
         total_elapsed = time.time() - start_time
 
         if process.returncode != 0:
-            stderr_text = b''.join(stderr_output).decode('utf-8', errors='replace')
+            stderr_text = Path(report_path).read_text(encoding='utf-8', errors='replace')
             # Clean up partial files on failure
-            if hls_dir.exists():
-                for f in hls_dir.iterdir():
-                    f.unlink()
-                hls_dir.rmdir()
+            shutil.rmtree(hls_dir, ignore_errors=True)
             log(f"  FAILED after {format_duration(total_elapsed)}")
+
+            # A hardware encoder that passed the smoke test can still fail on
+            # a real file (e.g. a source codec the GPU can't decode), so give
+            # it one more go on the CPU. Timeouts and stalls aren't retried.
+            if hw and not killed:
+                log(f"  Retrying with libx264: {mkv_path.name}")
+                return generate_hls(mkv_path, True, index, total, timeout_minutes, stall_timeout, threads, None, cpus)
+
             return False, f"ffmpeg error: {stderr_text[-500:]}"
 
         log(f"  Done! Total time: {format_duration(total_elapsed)}")
@@ -240,29 +562,53 @@ def generate_hls(mkv_path: Path, force: bool = False, index: int = 0, total: int
     except Exception as e:
         log(f"  FAILED: {str(e)}")
         # Clean up on exception
-        if hls_dir.exists():
-            try:
-                for f in hls_dir.iterdir():
-                    f.unlink()
-                hls_dir.rmdir()
-            except:
-                pass
+        shutil.rmtree(hls_dir, ignore_errors=True)
         return False, f"Error: {str(e)}"
 
+    finally:
+        Path(report_path).unlink(missing_ok=True)
+
 
-def find_mkv_files(directory: Path) -> list[Path]:
-    """Find all MKV files in directory recursively."""
-    return sorted(directory.rglob('*.mkv'))
+def find_mkv_files(directory: Path, skip_patterns: list[str] | None = None, skipped_dirs: list[Path] | None = None) -> Iterator[Path]:
+    """
+    Find all MKV files in directory recursively.
+
+    Directories whose name contains a skip pattern (case-insensitive) are
+    pruned without being read, since every file below them would be skipped.
+    Pruned directories are appended to skipped_dirs, if given, for reporting.
+    """
+    skip_patterns = [pattern.lower() for pattern in skip_patterns or []]
+    pending = [str(directory)]
+
+    while pending:
+        # Read the whole listing first so an error can only skip an
+        # unreadable directory, not the rest of a partly-read one
+        try:
+            with os.scandir(pending.pop()) as it:
+                entries = list(it)
+        except OSError:
+            continue
+
+        for entry in entries:
+            # Don't descend into symlinked directories (like rglob), so a
+            # link loop can't list the same MKV under endless paths
+            if entry.is_dir(follow_symlinks=False):
+                name = entry.name.lower()
+                if not any(pattern in name for pattern in skip_patterns):
+                    pending.append(entry.path)
+                elif skipped_dirs is not None:
+                    skipped_dirs.append(Path(entry.path))
+            elif entry.name.endswith('.mkv') and entry.is_file():
+                yield Path(entry.path)
 
 
 def format_duration(seconds: float) -> str:
     """Format seconds as HH:MM:SS."""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
     if hours > 0:
-        return f"{hours}:{minutes:02d}:{secs:02d}"
-    return f"{minutes}:{secs:02d}"
+        return "%d:%02d:%02d" % (hours, minutes, secs)
+    return "%d:%02d" % (minutes, secs)
 
 
 def main():
@@ -284,7 +630,24 @@ def main():
         '--parallel', '-p',
         type=int,
         default=1,
-        help='Number of parallel transcodes (default: 1, be careful with CPU usage)'
+        metavar='N',
+        help='Parallel jobs (default: 1). Up to N transcodes run in one pool '
+             '(fewer if there are not enough cores, see --threads-per-encode) and up to N '
+             'remuxes in another, so up to 2N ffmpeg processes can run; be careful with CPU usage'
+    )
+    parser.add_argument(
+        '--hwaccel',
+        choices=['auto', 'none', *HW_ENCODERS],
+        default='auto',
+        help='Hardware H.264 encoder for transcodes (default: auto, falls back to libx264)'
+    )
+    parser.add_argument(
+        '--threads-per-encode',
+        type=int,
+        default=4,
+        help='With -p > 1: minimum CPU cores per software transcode (default: 4). '
+             'Parallel transcodes are limited to CPU cores / this value, and the '
+             'cores are then split evenly between them'
     )
     parser.add_argument(
         '--dry-run', '-n',
@@ -321,7 +684,14 @@ def main():
     print(f"Scanning for MKV files in: {media_dir}")
     print()
 
-    mkv_files = find_mkv_files(media_dir)
+    skipped_dirs = []
+    mkv_files = sorted(find_mkv_files(media_dir, args.skip, skipped_dirs))
+
+    # Skipped folders aren't scanned, so they're reported as a whole
+    for skipped_dir in sorted(skipped_dirs):
+        print(f"  [SKIP] {skipped_dir.relative_to(media_dir)}/")
+    if skipped_dirs:
+        print()
 
     if not mkv_files:
         print("No MKV files found.")
@@ -330,6 +700,34 @@ def main():
     print(f"Found {len(mkv_files)} MKV file(s):")
     print()
 
+    # Probe all files up front; ffprobe runs in its own process, so threads
+    # overlap the subprocess and metadata I/O. A dry run doesn't write
+    # probe sidecars into the media tree.
+    probe = functools.partial(get_video_info, write_cache=False) if args.dry_run else get_video_info
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+        video_info = dict(zip(mkv_files, executor.map(probe, map(str, mkv_files))))
+
+    # MKVs changed on disk since their HLS output was made need their source
+    # hashed (see is_hls_complete). That reads the whole file, so do it up
+    # front, a few at a time and with progress, rather than silently inside
+    # the status loop; the results are cached for the checks below.
+    if not args.force and not args.dry_run:
+        to_verify = [
+            mkv for mkv in mkv_files
+            if (Path(str(mkv) + '.hls') / 'source.sha256').exists()
+            and not is_hls_complete(Path(str(mkv) + '.hls'), mkv, check_source=False)
+        ]
+        if to_verify:
+            print(f"Verifying source hashes of {len(to_verify)} changed file(s)...")
+
+            def verify(mkv):
+                log(f"  Hashing: {mkv.relative_to(media_dir)}")
+                source_fingerprint(str(mkv))
+
+            with ThreadPoolExecutor(max_workers=SOURCE_HASH_WORKERS) as executor:
+                list(executor.map(verify, to_verify))
+            print()
+
     # Check status of each file
     to_process = []
     skipped_count = 0
@@ -347,13 +745,18 @@ def main():
         if skip_file:
             status = "[SKIP]"
             skipped_count += 1
-        elif not args.force and is_hls_complete(hls_dir, mkv):
+        # A dry run only reports: it doesn't hash touched MKVs (which reads
+        # all of their packets) or write to the media tree, so those show
+        # as pending even if generation would end up skipping them
+        elif not args.force and is_hls_complete(hls_dir, mkv, check_source=not args.dry_run):
             status = "[DONE]"
+            if not args.dry_run:
+                touch_playlist_if_stale(hls_dir, mkv)
         else:
             status = "[PENDING]"
             to_process.append(mkv)
 
-        duration = get_video_duration(str(mkv))
+        duration = video_info[mkv]['duration']
         duration_str = format_duration(duration) if duration > 0 else "??:??"
 
         print(f"  {status} {relative_path} ({duration_str})")
@@ -367,6 +770,8 @@ def main():
     status_parts = [f"{len(to_process)} file(s) need HLS generation"]
     if skipped_count > 0:
         status_parts.append(f"{skipped_count} skipped")
+    if skipped_dirs:
+        status_parts.append(f"{len(skipped_dirs)} folder(s) skipped")
     if args.timeout > 0:
         status_parts.append(f"timeout: {args.timeout}min")
     print(", ".join(status_parts) + ".")
@@ -375,6 +780,15 @@ def main():
         print("\nDry run - no files were processed.")
         sys.exit(0)
 
+    # Only probe for GPU encoders if something actually needs transcoding
+    hw_encoder = None
+    if any(video_info[mkv]['codec'] in TRANSCODE_CODECS for mkv in to_process):
+        hw_encoder = resolve_hw_encoder(args.hwaccel)
+        if hw_encoder:
+            print(f"Using hardware encoder: {HW_ENCODERS[hw_encoder]['encoder']}")
+        elif args.hwaccel not in ('auto', 'none'):
+            print(f"Warning: {args.hwaccel} encoder is not available, using libx264")
+
     print()
     log("=" * 56)
     log("Starting HLS generation...")
@@ -385,12 +799,53 @@ def main():
     fail_count = 0
 
     if args.parallel > 1:
-        # Parallel processing
-        with ThreadPoolExecutor(max_workers=args.parallel) as executor:
-            futures = {
-                executor.submit(generate_hls, mkv, args.force, i, len(to_process), args.timeout, args.stall_timeout): mkv
-                for i, mkv in enumerate(to_process, 1)
-            }
+        # Parallel processing. Transcodes are CPU-bound, so they share a small
+        # pool sized by cores per encode; remuxes (-c:v copy) barely use CPU
+        # and get their own larger pool instead of waiting behind transcodes.
+        # There is one thread per running ffmpeg and no reader threads; each
+        # worker sleeps in select() on its child's progress pipe, so workers
+        # hardly ever hold the GIL.
+        cpu_count = os.cpu_count() or 1
+        remux_workers = min(args.parallel, 16, cpu_count * 2)
+
+        if hw_encoder:
+            # GPU encodes barely use the CPU, so they aren't limited by core
+            # count or pinned (a libx264 retry then runs unpinned too)
+            transcode_workers = args.parallel
+            encode_threads = 0
+            slots = [None] * transcode_workers
+        else:
+            threads_per_encode = max(1, args.threads_per_encode)
+            transcode_workers = min(args.parallel, max(1, cpu_count // threads_per_encode))
+            # Split all the cores between the transcodes so none sit idle
+            encode_threads = max(1, cpu_count // transcode_workers)
+
+            # Give each concurrent transcode its own disjoint set of cores so
+            # the encoders don't migrate between (and thrash) each other's
+            # caches (None = unpinned, when there aren't enough CPUs for a
+            # full slot)
+            slots = cpu_slots(transcode_workers, encode_threads) or [None] * transcode_workers
+            transcode_workers = len(slots)
+
+        slot_queue = queue.Queue()
+        for slot in slots:
+            slot_queue.put(slot)
+
+        with ThreadPoolExecutor(max_workers=transcode_workers) as transcode_pool, \
+                ThreadPoolExecutor(max_workers=remux_workers) as remux_pool:
+            futures = {}
+            for i, mkv in enumerate(to_process, 1):
+                if video_info[mkv]['codec'] in TRANSCODE_CODECS:
+                    future = transcode_pool.submit(
+                        generate_hls_pinned, slot_queue, mkv, args.force, i, len(to_process),
+                        args.timeout, args.stall_timeout, encode_threads, hw_encoder
+                    )
+                else:
+                    future = remux_pool.submit(
+                        generate_hls, mkv, args.force, i, len(to_process),
+                        args.timeout, args.stall_timeout
+                    )
+                futures[future] = mkv
 
             for future in as_completed(futures):
                 mkv = futures[future]
@@ -406,7 +861,7 @@ def main():
     else:
         # Sequential processing with progress
         for i, mkv in enumerate(to_process, 1):
-            success, message = generate_hls(mkv, args.force, i, len(to_process), args.timeout, args.stall_timeout)
+            success, message = generate_hls(mkv, args.force, i, len(to_process), args.timeout, args.stall_timeout, hw_encoder=hw_encoder)
 
             if success:
                 success_count += 1
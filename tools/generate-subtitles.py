@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 
 """
-Auto-generate subtitles for video files using OpenAI Whisper
+Auto-generate subtitles for video files using Whisper (via faster-whisper)
 Usage: python3 generate-subtitles.py [--model small]
 
 Models (larger = more accurate but slower):
@@ -12,87 +12,197 @@ Models (larger = more accurate but slower):
 - large: Most accurate, very slow
 
 First time setup:
-  pip3 install openai-whisper
+  pip3 install faster-whisper
+
+faster-whisper runs the Whisper models with CTranslate2 using INT8
+quantization, which is several times faster than the reference PyTorch
+implementation at the same accuracy.
 """
 
 import os
 import sys
 import argparse
+import subprocess
+import tempfile
+import multiprocessing
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import media_walk
+
+VIDEO_EXTS = ('.mp4', '.mkv', '.avi', '.mov')
+VIDEO_EXT_SET = frozenset(VIDEO_EXTS)
+
+# CPU threads per Whisper process when transcribing several videos at once
+THREADS_PER_WORKER = 4
 
 def check_dependencies():
     """Check if required packages are installed"""
     try:
-        import whisper
-        return True
+        import faster_whisper
     except ImportError:
-        print("\n❌ Error: openai-whisper is not installed")
+        print("\n❌ Error: faster-whisper is not installed")
+        print("\nInstall it with:")
+        print("  pip3 install faster-whisper")
+        return False
+
+    try:
+        subprocess.run(['ffmpeg', '-version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        print("\n❌ Error: ffmpeg is not installed")
         print("\nInstall it with:")
-        print("  pip3 install openai-whisper")
-        print("\nNote: This will also install PyTorch, which is large (~2GB)")
+        print("  Ubuntu/Debian: sudo apt install ffmpeg")
+        print("  macOS: brew install ffmpeg")
+        print("  Windows: Download from https://ffmpeg.org/download.html")
         return False
 
+    return True
+
 def find_video_files(media_dir="media"):
     """Find all video files that don't have subtitles yet"""
-    video_extensions = ['.mp4', '.mkv', '.avi', '.mov']
     videos_without_subs = []
 
-    for root, dirs, files in os.walk(media_dir):
-        for file in files:
-            if any(file.lower().endswith(ext) for ext in video_extensions):
-                video_path = Path(root) / file
+    for root, entries in media_walk.walk(media_dir):
+        names = {entry.name for entry in entries}
+        for entry in entries:
+            base_name, ext = os.path.splitext(entry.name)
+            if ext.lower() in VIDEO_EXT_SET and entry.is_file():
                 # Check for existing VTT subtitle files
-                base_name = video_path.stem
-                vtt_path = video_path.parent / f"{base_name}.vtt"
-
-                if not vtt_path.exists():
-                    videos_without_subs.append(video_path)
+                if f"{base_name}.vtt" not in names:
+                    videos_without_subs.append(Path(entry.path))
 
     return videos_without_subs
 
-def generate_subtitles(video_path, model_name="small"):
-    """Generate subtitles for a video file"""
-    import whisper
+def extract_audio(video_path, wav_path):
+    """
+    Decode the first audio track to the 16 kHz mono WAV Whisper expects.
+    The video stream is skipped entirely, so nothing but audio gets decoded.
+    """
+    cmd = [
+        'ffmpeg',
+        '-v', 'error',
+        '-y',
+        '-i', str(video_path),
+        '-map', '0:a:0',
+        '-vn',
+        '-ac', '1',
+        '-ar', '16000',
+        '-f', 'wav',
+        str(wav_path)
+    ]
+    try:
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    except subprocess.CalledProcessError as e:
+        # Surface ffmpeg's reason (e.g. no audio track) in the error message
+        stderr = e.stderr.decode('utf-8', 'replace')[-500:].strip()
+        raise RuntimeError(f"ffmpeg could not extract audio: {stderr or e}") from e
+
+def has_gpu():
+    """Check if CTranslate2 can see a CUDA device"""
+    import ctranslate2
+    return ctranslate2.get_cuda_device_count() > 0
+
+def load_model(model_name="small", cpu_threads=0):
+    """Load a Whisper model (cached after first download), quantized to INT8"""
+    from faster_whisper import WhisperModel
+
+    return WhisperModel(
+        model_name,
+        device="auto",
+        compute_type="int8_float16" if has_gpu() else "int8",
+        cpu_threads=cpu_threads
+    )
+
+# Model loaded by each worker process, or why it couldn't be (see _init_worker)
+_worker_model = None
+_worker_load_error = None
 
-    print(f"\n🎬 Processing: {video_path}")
-    print(f"   Model: {model_name}")
+def _init_worker(model_name):
+    """Load the model once per worker process"""
+    global _worker_model, _worker_load_error
 
-    # Load model (cached after first download)
-    print("   Loading Whisper model...")
-    model = whisper.load_model(model_name)
+    # Only this worker's OpenMP/MKL runtimes read these, when ctranslate2 is
+    # first imported by load_model; the parent's environment is left alone
+    os.environ['OMP_NUM_THREADS'] = str(THREADS_PER_WORKER)
+    os.environ['MKL_NUM_THREADS'] = str(THREADS_PER_WORKER)
 
-    # Transcribe
-    print("   Transcribing audio... (this may take a while)")
-    result = model.transcribe(str(video_path), verbose=False)
+    # An exception here would break the whole pool, so keep it for the tasks
+    try:
+        _worker_model = load_model(model_name, cpu_threads=THREADS_PER_WORKER)
+    except Exception as e:
+        _worker_load_error = f"Could not load Whisper model '{model_name}': {e}"
+
+def _generate_in_worker(video_path):
+    """
+    Run generate_subtitles in a worker
+    Returns: (output, error) where output is the video's messages as one block,
+    so output from concurrent workers doesn't interleave, or None if the
+    model failed to load
+    """
+    if _worker_load_error:
+        return None, _worker_load_error
+
+    messages = []
+    try:
+        generate_subtitles(video_path, _worker_model, messages.append)
+        return "\n".join(messages), None
+    except Exception as e:
+        return "\n".join(messages), str(e)
+
+def generate_subtitles(video_path, model, log=print):
+    """
+    Generate subtitles for a video file using an already loaded model
+    Progress messages go to log (print by default)
+    """
+    log(f"\n🎬 Processing: {video_path}")
+
+    # Transcribe. The VAD filter skips long silences; greedy decoding
+    # (beam_size=1) is much faster than the default beam search with little
+    # quality loss. Segments are generated lazily, so finish transcribing
+    # before creating the VTT to avoid leaving a partial file on failure.
+    log("   Extracting audio...")
+    wav_fd, wav_path = tempfile.mkstemp(suffix='.wav')
+    os.close(wav_fd)
+    try:
+        extract_audio(video_path, wav_path)
+
+        log("   Transcribing audio... (this may take a while)")
+        segments, _ = model.transcribe(wav_path, vad_filter=True, beam_size=1)
+        segments = list(segments)
+    finally:
+        os.unlink(wav_path)
 
     # Save as VTT (WebVTT format for web browsers)
     vtt_path = video_path.parent / f"{video_path.stem}.vtt"
 
-    with open(vtt_path, 'w', encoding='utf-8') as f:
-        # WebVTT header
-        f.write("WEBVTT\n\n")
+    # WebVTT header
+    parts = ["WEBVTT\n\n"]
+    parts_append = parts.append
+
+    for segment in segments:
+        # VTT format:
+        # 00:00:00.000 --> 00:00:02.000
+        # Subtitle text
+        start = format_timestamp(segment.start)
+        end = format_timestamp(segment.end)
+        text = segment.text.strip()
 
-        for segment in result['segments']:
-            # VTT format:
-            # 00:00:00.000 --> 00:00:02.000
-            # Subtitle text
-            start = format_timestamp(segment['start'])
-            end = format_timestamp(segment['end'])
-            text = segment['text'].strip()
+        parts_append(f"{start} --> {end}\n{text}\n\n")
 
-            f.write(f"{start} --> {end}\n")
-            f.write(f"{text}\n\n")
+    with open(vtt_path, 'w', encoding='utf-8') as f:
+        f.write("".join(parts))
 
-    print(f"   ✅ Saved: {vtt_path}")
+    log(f"   ✅ Saved: {vtt_path}")
     return vtt_path
 
 def format_timestamp(seconds):
     """Convert seconds to VTT timestamp format (HH:MM:SS.mmm)"""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    millis = int((seconds % 1) * 1000)
-    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}"
+    whole_seconds = int(seconds)
+    millis = int((seconds - whole_seconds) * 1000)
+    minutes, secs = divmod(whole_seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return "%02d:%02d:%02d.%03d" % (hours, minutes, secs, millis)
 
 def main():
     parser = argparse.ArgumentParser(
@@ -134,18 +244,63 @@ def main():
         print("Cancelled.")
         return
 
-    # Process each video
+    # A GPU runs one video at a time (one CUDA context). On the CPU each
+    # Whisper process uses a few threads, so run one process per group of
+    # cores; separate processes also keep the GIL out of the way.
+    workers = 1 if has_gpu() else max(1, (os.cpu_count() or 1) // THREADS_PER_WORKER)
+    workers = min(workers, len(videos))
+
     print(f"\n{'='*60}")
     print("Starting subtitle generation...")
     print(f"{'='*60}")
 
-    for i, video in enumerate(videos, 1):
-        print(f"\n[{i}/{len(videos)}]")
+    if workers > 1:
+        print(f"\n🧠 Loading Whisper model: {args.model} ({workers} workers)")
+
+        # Spawn (not fork) so workers don't inherit this process's threading
+        # state; each one sets its thread counts in _init_worker
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(args.model,)
+        ) as executor:
+            futures = {executor.submit(_generate_in_worker, video): video for video in videos}
+            for i, future in enumerate(as_completed(futures), 1):
+                video = futures[future]
+                try:
+                    output, error = future.result()
+                except BrokenProcessPool as e:
+                    executor.shutdown(cancel_futures=True)
+                    print(f"\n❌ Error: A Whisper worker process exited unexpectedly: {e}")
+                    sys.exit(1)
+
+                if output is None:
+                    # The model didn't load, so no other video will work either
+                    executor.shutdown(cancel_futures=True)
+                    print(f"\n❌ Error: {error}")
+                    sys.exit(1)
+
+                print(output)
+                if error:
+                    print(f"   ❌ Error: {error}")
+                print(f"[{i}/{len(videos)}] {'❌' if error else '✅'} {video.name}")
+    else:
+        # Load the model once and reuse it for every video
+        print(f"\n🧠 Loading Whisper model: {args.model}")
         try:
-            generate_subtitles(video, args.model)
+            model = load_model(args.model)
         except Exception as e:
-            print(f"   ❌ Error: {e}")
-            continue
+            print(f"\n❌ Error: Could not load Whisper model '{args.model}': {e}")
+            sys.exit(1)
+
+        for i, video in enumerate(videos, 1):
+            print(f"\n[{i}/{len(videos)}]")
+            try:
+                generate_subtitles(video, model)
+            except Exception as e:
+                print(f"   ❌ Error: {e}")
+                continue
 
     print(f"\n{'='*60}")
     print("✅ Subtitle generation complete!")
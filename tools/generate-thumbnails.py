@@ -8,18 +8,35 @@ Examples:
   python3 generate-thumbnails.py           # Uses 'media' directory (default)
   python3 generate-thumbnails.py /videos   # Uses '/videos' directory
 
-This will extract a frame from each video (at 10% duration) and save it as a thumbnail.
+This will pick the most representative frame near 10% of each video's duration
+and save it as a thumbnail.
 """
 
 import os
 import sys
 import subprocess
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import probe_cache
+import media_walk
+
+VIDEO_EXTS = ('.mp4', '.mkv', '.avi', '.mov')
+VIDEO_EXT_SET = frozenset(VIDEO_EXTS)
+
+# Serializes console output from worker threads
+print_lock = threading.Lock()
+
+def log(message):
+    """Print a message without interleaving output from other workers"""
+    with print_lock:
+        print(message, flush=True)
 
 def check_dependencies():
     """Check if ffmpeg is installed"""
     try:
-        subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
+        subprocess.run(['ffmpeg', '-version'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
         return True
     except (subprocess.CalledProcessError, FileNotFoundError):
         print("\n❌ Error: ffmpeg is not installed")
@@ -30,19 +47,11 @@ def check_dependencies():
         return False
 
 def get_video_duration(video_path):
-    """Get video duration in seconds using ffprobe"""
+    """Get video duration in seconds using ffprobe (cached in a sidecar file)"""
     try:
-        cmd = [
-            'ffprobe',
-            '-v', 'error',
-            '-show_entries', 'format=duration',
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            str(video_path)
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return float(result.stdout.strip())
+        return float(probe_cache.probe(video_path)['format']['duration'])
     except Exception as e:
-        print(f"   ⚠️  Could not get duration: {e}")
+        log(f"   ⚠️  Could not get duration of {video_path.name}: {e}")
         return None
 
 def generate_thumbnail(video_path, timestamp=None):
@@ -51,10 +60,12 @@ def generate_thumbnail(video_path, timestamp=None):
 
     # Skip if thumbnail already exists
     if thumbnail_path.exists():
-        print(f"   ⏭️  Thumbnail already exists: {thumbnail_path.name}")
+        log(f"   ⏭️  Thumbnail already exists: {thumbnail_path.name}")
         return thumbnail_path
 
-    print(f"\n🎬 Processing: {video_path.name}")
+    # Collect this video's messages and print them as one block, so output
+    # from concurrent workers doesn't interleave
+    messages = [f"\n🎬 Processing: {video_path.name}"]
 
     # Get video duration if timestamp not provided
     if timestamp is None:
@@ -62,45 +73,53 @@ def generate_thumbnail(video_path, timestamp=None):
         if duration:
             # Extract frame at 10% through the video
             timestamp = duration * 0.1
-            print(f"   ⏱️  Extracting frame at {timestamp:.1f}s ({duration:.1f}s total)")
+            messages.append(f"   ⏱️  Extracting frame at {timestamp:.1f}s ({duration:.1f}s total)")
         else:
             # Fallback to 5 seconds if we can't get duration
             timestamp = 5
-            print(f"   ⏱️  Extracting frame at {timestamp}s (default)")
+            messages.append(f"   ⏱️  Extracting frame at {timestamp}s (default)")
 
     # Generate thumbnail using ffmpeg
     cmd = [
         'ffmpeg',
-        '-ss', str(timestamp),  # Seek to timestamp
+        '-ss', str(timestamp),   # Seek to timestamp
+        '-noaccurate_seek',      # Start at the preceding keyframe, no decoding up to the exact time
         '-i', str(video_path),   # Input file
-        '-vframes', '1',         # Extract 1 frame
-        '-vf', 'scale=1920:-1',  # Scale to 1920px width (1080p), maintain aspect ratio
+        '-an', '-sn', '-dn',     # Ignore audio, subtitle and data streams
+        '-frames:v', '1',        # Extract 1 frame
+        # Scale to 1920px width (1080p), keeping aspect ratio, then pick the most
+        # representative of the next 100 frames (avoids black or transition
+        # frames). Scaling first means the filter buffers 100 1080p frames rather
+        # than 100 full-size (e.g. 4K) ones.
+        '-vf', 'scale=1920:-1,thumbnail=100',
         '-q:v', '2',             # High quality (2-5 is good, lower is better)
         '-y',                    # Overwrite output file
         str(thumbnail_path)
     ]
 
     try:
-        subprocess.run(cmd, capture_output=True, check=True)
-        print(f"   ✅ Saved: {thumbnail_path.name}")
+        # stderr is only kept for the error message; stdout is never read
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+        messages.append(f"   ✅ Saved: {thumbnail_path.name}")
         return thumbnail_path
     except subprocess.CalledProcessError as e:
-        print(f"   ❌ Error generating thumbnail: {e}")
+        stderr = e.stderr.decode('utf-8', 'replace')[-500:].strip()
+        messages.append(f"   ❌ Error generating thumbnail for {video_path.name}: {e}\n{stderr}")
         return None
+    finally:
+        log("\n".join(messages))
 
 def find_videos_without_thumbnails(media_dir="media"):
     """Find all video files that don't have thumbnails yet"""
-    video_extensions = ['.mp4', '.mkv', '.avi', '.mov']
     videos_without_thumbs = []
 
-    for root, dirs, files in os.walk(media_dir):
-        for file in files:
-            if any(file.lower().endswith(ext) for ext in video_extensions):
-                video_path = Path(root) / file
-                thumbnail_path = video_path.parent / f"{video_path.stem}.jpg"
-
-                if not thumbnail_path.exists():
-                    videos_without_thumbs.append(video_path)
+    for root, entries in media_walk.walk(media_dir):
+        names = {entry.name for entry in entries}
+        for entry in entries:
+            base_name, ext = os.path.splitext(entry.name)
+            if ext.lower() in VIDEO_EXT_SET and entry.is_file():
+                if f"{base_name}.jpg" not in names:
+                    videos_without_thumbs.append(Path(entry.path))
 
     return videos_without_thumbs
 
@@ -145,13 +164,19 @@ def main():
     successful = 0
     failed = 0
 
-    for i, video in enumerate(videos, 1):
-        print(f"\n[{i}/{len(videos)}]")
-        result = generate_thumbnail(video)
-        if result:
-            successful += 1
-        else:
-            failed += 1
+    # Each thumbnail is its own ffmpeg process, so run several at once
+    with ThreadPoolExecutor(max_workers=min(os.cpu_count() or 1, 8)) as executor:
+        futures = {
+            executor.submit(generate_thumbnail, video): video
+            for video in videos
+        }
+
+        for i, future in enumerate(as_completed(futures), 1):
+            if future.result():
+                successful += 1
+            else:
+                failed += 1
+            log(f"[{i}/{len(videos)}] {futures[future].name}")
 
     print(f"\n{'='*60}")
     print(f"✅ Thumbnail generation complete!")
@@ -0,0 +1,34 @@
+"""
+Shared directory walker for the media scanning scripts.
+
+Like os.walk, but yields each directory's os.DirEntry list, so callers can
+check file types and sidecar files from the cached directory read instead
+of a stat() per path. Symlinked directories are not followed.
+
+Usage (from another script in tools/):
+    import media_walk
+    for root, entries in media_walk.walk(media_dir):
+        names = {entry.name for entry in entries}
+"""
+
+import os
+
+
+def walk(path):
+    """
+    Recursively yield (directory, entries) for every directory under path.
+
+    Directories that can't be read are skipped along with everything below
+    them.
+    """
+    try:
+        with os.scandir(path) as it:
+            entries = list(it)
+    except OSError:
+        return
+
+    yield path, entries
+
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from walk(entry.path)
@@ -0,0 +1,103 @@
+"""
+Shared ffprobe helper that caches results in a sidecar JSON file.
+
+Probe results are stored next to the media file (video.mkv ->
+video.mkv.probe.json) together with the media file's size and mtime, and
+reused while both still match, so repeat runs of the tools skip ffprobe for
+files that haven't changed.
+
+Usage (from another script in tools/):
+    import probe_cache
+    info = probe_cache.probe(video_path)
+    duration = float(info['format']['duration'])
+"""
+
+import os
+import json
+import subprocess
+import tempfile
+from pathlib import Path
+
+# Everything the tools need from ffprobe, requested in a single call
+PROBE_ENTRIES = 'stream=index,codec_type,codec_name,channels,sample_rate,bit_rate:format=duration'
+
+
+def sidecar_path(path) -> Path:
+    """Get the path of the probe cache file for a media file."""
+    return Path(f"{path}.probe.json")
+
+
+def run_ffprobe(path) -> dict:
+    """Run ffprobe on a file and return its parsed JSON output."""
+    cmd = [
+        'ffprobe',
+        '-v', 'error',
+        '-show_entries', PROBE_ENTRIES,
+        '-of', 'json',
+        str(path)
+    ]
+
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=5)
+    except subprocess.TimeoutExpired:
+        # A healthy probe takes well under a second; give slow storage
+        # (e.g. a network share) one longer attempt before giving up
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"ffprobe exited with {result.returncode}")
+
+    return json.loads(result.stdout)
+
+
+def probe(path, write: bool = True) -> dict:
+    """
+    Get ffprobe's JSON output for a file, using the sidecar cache when fresh.
+
+    With write=False a fresh sidecar is still used, but a new result isn't
+    saved (e.g. for dry runs that shouldn't touch the media tree).
+
+    Raises the underlying error if ffprobe fails; failures are not cached.
+    """
+    path = Path(path)
+    cache_path = sidecar_path(path)
+    st = path.stat()
+
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        # Compare the exact size and mtime rather than checking the sidecar
+        # is newer, so a file replaced by an older-dated copy is re-probed.
+        # Sidecars written with different entries are treated as stale too.
+        if (cached.get('entries') == PROBE_ENTRIES
+                and cached.get('size') == st.st_size
+                and cached.get('mtime_ns') == st.st_mtime_ns):
+            return cached['data']
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
+
+    data = run_ffprobe(path)
+    if not write:
+        return data
+
+    # Write atomically so a concurrent reader never sees a partial file; a
+    # unique temp name keeps tools probing the same file from colliding
+    temp_path = None
+    try:
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=cache_path.parent,
+                                         prefix=f"{cache_path.name}.", suffix='.tmp',
+                                         delete=False) as f:
+            temp_path = f.name
+            json.dump({
+                'entries': PROBE_ENTRIES,
+                'size': st.st_size,
+                'mtime_ns': st.st_mtime_ns,
+                'data': data
+            }, f)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        # Read-only media still works, it just isn't cached
+        if temp_path:
+            Path(temp_path).unlink(missing_ok=True)
+
+    return data